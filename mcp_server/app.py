@@ -1,18 +1,36 @@
+import asyncio
 import json
 import logging
+import os
+import time
+import uuid
 from logging.handlers import RotatingFileHandler
 from typing import Any, AsyncGenerator
 
 from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 import httpx
 from sse_starlette.sse import EventSourceResponse
 
+from . import tracing, upstream
+from .compression import CompressionMiddleware
 from .db import get_tool, list_tools
+from .inflight import InflightError, InflightTable
+from .templating import TemplateError, compile_template
 
 app = FastAPI(title="mcp-server")
+app.add_middleware(
+    CompressionMiddleware,
+    paths={"/mcp/tools", "/mcp/streamable_http", "/mcp/sse"},
+)
+app.add_middleware(tracing.TracingMiddleware)
+app.add_event_handler("shutdown", tracing.shutdown)
 
 MCP_JSONRPC_VERSION = "2.0"
+PROGRESS_INTERVAL = float(os.environ.get("MCP_PROGRESS_INTERVAL", "1.0"))
+
+_inflight = InflightTable()
 
 logging.basicConfig(
     level=logging.INFO,
@@ -72,36 +90,52 @@ async def _call_tool_http(tool: dict, arguments: dict | None) -> dict:
     if not isinstance(headers, dict):
         headers = {}
 
-    params = None
-    json_body = None
-    if method in {"GET", "DELETE"}:
-        params = arguments or {}
-    else:
-        json_body = arguments or {}
+    try:
+        template = compile_template(tool)
+        request = template.render(arguments or {})
+    except TemplateError as exc:
+        return {
+            "content": [{"type": "text", "text": f"Invalid request template: {exc}"}],
+            "isError": True,
+        }
+    url = request["url"]
+    headers = {**headers, **request["headers"]}
+    params = request["params"]
+    json_body = request["json"]
+    form_body = request["data"]
 
     logger.info(
-        "tool_request tool=%s method=%s url=%s headers=%s params=%s json=%s",
+        "tool_request request_id=%s tool=%s method=%s url=%s headers=%s params=%s json=%s form=%s",
+        tracing.current_request_id(),
         tool.get("tool_name"),
         method,
         url,
         json.dumps(headers, ensure_ascii=False),
         json.dumps(params, ensure_ascii=False) if params is not None else None,
         json.dumps(json_body, ensure_ascii=False) if json_body is not None else None,
+        json.dumps(form_body, ensure_ascii=False) if form_body is not None else None,
     )
 
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.request(
-                method,
-                url,
-                headers=headers,
-                params=params,
-                json=json_body,
-            )
+        with tracing.span("upstream", tool=tool.get("tool_name")):
+            async with httpx.AsyncClient() as client:
+                resp = await upstream.send(
+                    client,
+                    tool,
+                    method,
+                    url,
+                    headers={**headers, **tracing.propagation_headers()},
+                    params=params,
+                    json=json_body,
+                    data=form_body,
+                )
         structured: dict[str, Any] | None = None
         text = resp.text
         try:
             data = resp.json()
+            extracted = None if resp.is_error else template.extract(data)
+            if extracted is not None:
+                data = extracted
             structured = data if isinstance(data, dict) else {"data": data}
             text = json.dumps(data, ensure_ascii=False)
         except Exception:
@@ -109,7 +143,8 @@ async def _call_tool_http(tool: dict, arguments: dict | None) -> dict:
 
         if resp.is_error:
             logger.info(
-                "tool_response tool=%s status=%s error=true body=%s",
+                "tool_response request_id=%s tool=%s status=%s error=true body=%s",
+                tracing.current_request_id(),
                 tool.get("tool_name"),
                 resp.status_code,
                 text,
@@ -121,7 +156,8 @@ async def _call_tool_http(tool: dict, arguments: dict | None) -> dict:
             }
 
         logger.info(
-            "tool_response tool=%s status=%s error=false body=%s",
+            "tool_response request_id=%s tool=%s status=%s error=false body=%s",
+            tracing.current_request_id(),
             tool.get("tool_name"),
             resp.status_code,
             text,
@@ -132,13 +168,95 @@ async def _call_tool_http(tool: dict, arguments: dict | None) -> dict:
             "isError": False,
         }
     except Exception as exc:
-        logger.exception("tool_response tool=%s error=true exception=%s", tool.get("tool_name"), exc)
+        logger.exception(
+            "tool_response request_id=%s tool=%s error=true exception=%s",
+            tracing.current_request_id(),
+            tool.get("tool_name"),
+            exc,
+        )
         return {
             "content": [{"type": "text", "text": f"Request failed: {exc}"}],
             "isError": True,
         }
 
 
+def _inflight_key(request: Request, req_id: str | int | None) -> tuple | None:
+    # JSON-RPC ids are only unique per client session, so calls are keyed on the
+    # Mcp-Session-Id issued by initialize. Without one there is nothing to scope
+    # the id to, and the call can only be cancelled by disconnecting.
+    session_id = request.headers.get("mcp-session-id")
+    if not session_id:
+        return None
+    return (session_id, req_id)
+
+
+def _log_tool_result(name: str, result: dict) -> None:
+    logger.info(
+        "tool_result request_id=%s name=%s result=%s",
+        tracing.current_request_id(),
+        name,
+        json.dumps(result, ensure_ascii=False),
+    )
+
+
+async def _await_tool_call(request: Request, task: asyncio.Task) -> dict | None:
+    """Wait for a tool call, cancelling it if the client disconnects.
+
+    Returns None if the call was cancelled.
+    """
+    try:
+        while not task.done():
+            await asyncio.wait({task}, timeout=PROGRESS_INTERVAL)
+            if not task.done() and await request.is_disconnected():
+                task.cancel()
+                break
+        return await task
+    except asyncio.CancelledError:
+        if not task.cancelled():
+            raise
+        return None
+    finally:
+        task.cancel()
+
+
+async def _tool_call_events(
+    req_id: str | int | None, name: str, task: asyncio.Task, progress_token: str | int
+) -> AsyncGenerator[dict, None]:
+    # SSE stream: notifications/progress while the call runs, then the response.
+    # If the client goes away the generator is closed and the call is cancelled.
+    started = time.monotonic()
+    try:
+        while not task.done():
+            await asyncio.wait({task}, timeout=PROGRESS_INTERVAL)
+            if task.done():
+                break
+            elapsed = time.monotonic() - started
+            notification = {
+                "jsonrpc": MCP_JSONRPC_VERSION,
+                "method": "notifications/progress",
+                "params": {
+                    "progressToken": progress_token,
+                    "progress": round(elapsed, 1),
+                    "message": f"{name} running for {elapsed:.0f}s",
+                },
+            }
+            yield {"event": "message", "data": json.dumps(notification, ensure_ascii=False)}
+        if task.cancelled():
+            logger.info("tool_cancelled request_id=%s name=%s", tracing.current_request_id(), name)
+            message = {
+                "jsonrpc": MCP_JSONRPC_VERSION,
+                "id": req_id,
+                "error": {"code": -32800, "message": "Request cancelled"},
+            }
+        else:
+            result = task.result()
+            _log_tool_result(name, result)
+            message = {"jsonrpc": MCP_JSONRPC_VERSION, "id": req_id, "result": result}
+        yield {"event": "message", "data": json.dumps(message, ensure_ascii=False)}
+    finally:
+        task.cancel()
+
+
 @app.get("/mcp/tools")
 def mcp_tools():
     # Dynamic read from DB on each request
@@ -183,7 +301,7 @@ async def mcp_streamable_http(
         method = body.get("method")
         if method in ("initialize", "mcp:initialize"):
             # Minimal MCP initialize response
-            return _jsonrpc_result(
+            response = _jsonrpc_result(
                 req_id,
                 {
                     "protocolVersion": "2024-11-05",
@@ -193,32 +311,66 @@ async def mcp_streamable_http(
                     "serverInfo": {"name": "mcp-server", "version": "0.1.0"},
                 },
             )
+            response.headers["Mcp-Session-Id"] = uuid.uuid4().hex
+            return response
         if method in ("notifications/initialized", "mcp:initialized"):
             return _jsonrpc_result(req_id, {})
+        if method in ("notifications/cancelled",):
+            params = body.get("params") or {}
+            key = _inflight_key(request, params.get("requestId"))
+            cancelled = key is not None and _inflight.cancel(key)
+            logger.info(
+                "tool_cancel request_id=%s target=%s found=%s reason=%s",
+                tracing.current_request_id(),
+                params.get("requestId"),
+                cancelled,
+                params.get("reason"),
+            )
+            return _jsonrpc_result(req_id, {})
         if method in ("mcp:list-tools", "tools/list"):
-            tools = [_to_mcp_tool(t) for t in list_tools()]
-            return _jsonrpc_result(req_id, {"tools": tools})
+            with tracing.span("registry.list_tools"):
+                tools = [_to_mcp_tool(t) for t in list_tools()]
+            with tracing.span("encode"):
+                return _jsonrpc_result(req_id, {"tools": tools})
         if method in ("tools/call",):
             params = body.get("params") or {}
             name = params.get("name")
             arguments = params.get("arguments") or {}
             if not name:
                 return _jsonrpc_error(req_id, -32602, "Missing tool name")
-            tool = get_tool(name)
+            with tracing.span("registry.get_tool", tool=name):
+                tool = get_tool(name)
             if not tool:
                 return _jsonrpc_error(req_id, -32602, f"Tool not found: {name}")
             logger.info(
-                "tool_call name=%s args=%s",
+                "tool_call request_id=%s name=%s args=%s",
+                tracing.current_request_id(),
                 name,
                 json.dumps(arguments, ensure_ascii=False),
             )
-            result = await _call_tool_http(tool, arguments)
-            logger.info(
-                "tool_result name=%s result=%s",
-                name,
-                json.dumps(result, ensure_ascii=False),
-            )
-            return _jsonrpc_result(req_id, result)
+            try:
+                key = _inflight_key(request, req_id) or ("", uuid.uuid4().hex)
+                task = _inflight.start(key, _call_tool_http(tool, arguments))
+            except InflightError as exc:
+                return _jsonrpc_error(req_id, -32000, str(exc))
+
+            # Stream progress over SSE when the client asked for it.
+            progress_token = (params.get("_meta") or {}).get("progressToken")
+            if progress_token is not None and "text/event-stream" in request.headers.get("accept", ""):
+                # background runs once the response ends, even if the client left
+                # before the generator (and its finally) ever started.
+                return EventSourceResponse(
+                    _tool_call_events(req_id, name, task, progress_token),
+                    background=BackgroundTask(task.cancel),
+                )
+
+            result = await _await_tool_call(request, task)
+            if result is None:
+                logger.info("tool_cancelled request_id=%s name=%s", tracing.current_request_id(), name)
+                return _jsonrpc_error(req_id, -32800, "Request cancelled")
+            _log_tool_result(name, result)
+            with tracing.span("encode"):
+                return _jsonrpc_result(req_id, result)
         return _jsonrpc_error(req_id, -32601, f"Method not found: {method}")
 
     if tool_name:
@@ -0,0 +1,169 @@
+import os
+import zlib
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+COMPRESS_MIN_SIZE = int(os.environ.get("MCP_COMPRESS_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.environ.get("MCP_COMPRESS_GZIP_LEVEL", "6"))
+
+
+class _Gzip:
+    def __init__(self) -> None:
+        self._obj = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data) + self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes) -> bytes:
+        return self._obj.compress(data) + self._obj.flush()
+
+
+class _Brotli:
+    def __init__(self) -> None:
+        self._obj = brotli.Compressor()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.process(data) + self._obj.flush()
+
+    def finish(self, data: bytes) -> bytes:
+        return self._obj.process(data) + self._obj.finish()
+
+
+class _Zstd:
+    def __init__(self) -> None:
+        self._obj = zstandard.ZstdCompressor().compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data) + self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self, data: bytes) -> bytes:
+        return self._obj.compress(data) + self._obj.flush()
+
+
+# Server preference order, used to break ties between equal q-values.
+_COMPRESSORS: Dict[str, Callable[[], Any]] = {}
+if zstandard is not None:
+    _COMPRESSORS["zstd"] = _Zstd
+if brotli is not None:
+    _COMPRESSORS["br"] = _Brotli
+_COMPRESSORS["gzip"] = _Gzip
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    qvalues: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        token, *params = item.split(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() != "q":
+                continue
+            try:
+                q = float(value.strip())
+            except ValueError:
+                # Unreadable weight: treat the coding as refused, not unlisted.
+                q = 0.0
+        qvalues[token] = q
+
+    best: Optional[str] = None
+    best_q = 0.0
+    # "*" only stands for codings the client did not list explicitly.
+    wildcard = qvalues.get("*", 0.0)
+    for name in _COMPRESSORS:  # server preference order breaks ties
+        q = qvalues.get(name, wildcard)
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+class CompressionMiddleware:
+    """Negotiated gzip/br/zstd compression for the given paths.
+
+    Complete bodies smaller than ``minimum_size`` are sent as-is. Streamed
+    bodies (SSE, streamable HTTP) are flushed per chunk so events are not held
+    back.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        paths: Iterable[str],
+        minimum_size: int = COMPRESS_MIN_SIZE,
+    ) -> None:
+        self.app = app
+        self.paths = set(paths)
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressingResponder(send, encoding, self.minimum_size)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressingResponder:
+    def __init__(self, send: Send, encoding: str, minimum_size: int) -> None:
+        self._send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start: Optional[Message] = None
+        self.compressor: Any = None
+        self.passthrough = False
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if message["type"] != "http.response.body":
+            await self._flush_start()
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.start is not None:
+            headers = MutableHeaders(raw=self.start["headers"])
+            if "content-encoding" in headers:
+                # Never encode twice; no handler sets this today.
+                self.passthrough = True
+            else:
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body and len(body) < self.minimum_size:
+                    self.passthrough = True
+                else:
+                    headers["Content-Encoding"] = self.encoding
+                    if "content-length" in headers:
+                        del headers["Content-Length"]
+                    self.compressor = _COMPRESSORS[self.encoding]()
+            await self._flush_start()
+
+        if self.passthrough:
+            await self._send(message)
+            return
+        data = self.compressor.compress(body) if more_body else self.compressor.finish(body)
+        await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    async def _flush_start(self) -> None:
+        if self.start is not None:
+            await self._send(self.start)
+            self.start = None
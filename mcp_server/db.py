@@ -28,7 +28,8 @@ def list_tools() -> List[Dict[str, Any]]:
         with conn.cursor() as cur:
             cur.execute(
                 "SELECT tool_name, description, inputSchema_type, inputSchema_properties, "
-                "inputSchema_required, req_url, req_header, req_method, outputSchema_description "
+                "inputSchema_required, req_url, req_header, req_method, req_policy, req_template, "
+                "outputSchema_description "
                 "FROM tool_list ORDER BY tool_name"
             )
             rows = cur.fetchall()
@@ -40,7 +41,8 @@ def get_tool(name: str) -> Optional[Dict[str, Any]]:
         with conn.cursor() as cur:
             cur.execute(
                 "SELECT tool_name, description, inputSchema_type, inputSchema_properties, "
-                "inputSchema_required, req_url, req_header, req_method, outputSchema_description "
+                "inputSchema_required, req_url, req_header, req_method, req_policy, req_template, "
+                "outputSchema_description "
                 "FROM tool_list WHERE tool_name = %s",
                 (name,),
             )
@@ -52,12 +54,18 @@ def _row_to_tool(row: Dict[str, Any]) -> Dict[str, Any]:
     properties = row["inputSchema_properties"]
     required = row["inputSchema_required"]
     headers = row["req_header"]
+    policy = row.get("req_policy")
+    template = row.get("req_template")
     if isinstance(properties, str):
         properties = json.loads(properties or "{}")
     if isinstance(required, str):
         required = json.loads(required or "[]")
     if isinstance(headers, str):
         headers = json.loads(headers or "{}")
+    if isinstance(policy, str):
+        policy = json.loads(policy or "{}")
+    if isinstance(template, str):
+        template = json.loads(template or "{}")
     return {
         "tool_name": row["tool_name"],
         "description": row["description"],
@@ -69,6 +77,8 @@ def _row_to_tool(row: Dict[str, Any]) -> Dict[str, Any]:
         "req_url": row["req_url"],
         "req_header": headers,
         "req_method": row["req_method"],
+        "req_policy": policy or {},
+        "req_template": template or {},
         "outputSchema": {
             "description": row["outputSchema_description"],
         },
@@ -0,0 +1,48 @@
+import asyncio
+import os
+from typing import Any, Coroutine, Dict, Hashable
+
+MAX_INFLIGHT_CALLS = int(os.environ.get("MCP_MAX_INFLIGHT_CALLS", "256"))
+
+
+class InflightError(RuntimeError):
+    pass
+
+
+class InflightTable:
+    """Bounded table of running ``tools/call`` tasks, keyed by request id.
+
+    Entries remove themselves when their task finishes, so cancelling a task
+    (``notifications/cancelled`` or a client disconnect) frees its slot at once.
+    """
+
+    def __init__(self, max_size: int = MAX_INFLIGHT_CALLS) -> None:
+        self.max_size = max_size
+        self._tasks: Dict[Hashable, "asyncio.Task[Any]"] = {}
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def start(self, key: Hashable, coro: Coroutine[Any, Any, Any]) -> "asyncio.Task[Any]":
+        if key in self._tasks:
+            coro.close()
+            raise InflightError("Request id is already in flight")
+        if len(self._tasks) >= self.max_size:
+            coro.close()
+            raise InflightError("Too many in-flight tool calls")
+        task = asyncio.ensure_future(coro)
+        self._tasks[key] = task
+
+        def _discard(done: "asyncio.Task[Any]") -> None:
+            if self._tasks.get(key) is done:
+                del self._tasks[key]
+
+        task.add_done_callback(_discard)
+        return task
+
+    def cancel(self, key: Hashable) -> bool:
+        task = self._tasks.get(key)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        return True
@@ -9,6 +9,19 @@ DB_USER = os.environ.get("MCP_DB_USER", "admin")
 DB_PASSWORD = os.environ.get("MCP_DB_PASSWORD", "123")
 DB_NAME = os.environ.get("MCP_DB_NAME", "tool")
 
+# Columns added after the first release; created on existing tables by main().
+OPTIONAL_COLUMNS = {
+    "req_policy": "JSON NULL",
+    "req_template": "JSON NULL",
+}
+
+
+def _add_missing_columns(cur) -> None:
+    for column, definition in OPTIONAL_COLUMNS.items():
+        cur.execute("SHOW COLUMNS FROM tool_list LIKE %s", (column,))
+        if cur.fetchone() is None:
+            cur.execute(f"ALTER TABLE tool_list ADD COLUMN {column} {definition}")
+
 
 def main() -> None:
     conn = pymysql.connect(
@@ -31,17 +44,21 @@ def main() -> None:
             req_url TEXT NOT NULL,
             req_header JSON NOT NULL,
             req_method VARCHAR(16) NOT NULL,
+            req_policy JSON NULL,
+            req_template JSON NULL,
             outputSchema_description TEXT NOT NULL
         )
         """
     )
+    _add_missing_columns(cur)
     cur.execute(
         """
         INSERT INTO tool_list (
             tool_name, description, inputSchema_type, inputSchema_properties,
-            inputSchema_required, req_url, req_header, req_method, outputSchema_description
+            inputSchema_required, req_url, req_header, req_method, req_policy,
+            outputSchema_description
         )
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
         ON DUPLICATE KEY UPDATE
             description=VALUES(description),
             inputSchema_type=VALUES(inputSchema_type),
@@ -50,6 +67,7 @@ def main() -> None:
             req_url=VALUES(req_url),
             req_header=VALUES(req_header),
             req_method=VALUES(req_method),
+            req_policy=VALUES(req_policy),
             outputSchema_description=VALUES(outputSchema_description)
         """,
         (
@@ -66,6 +84,7 @@ def main() -> None:
             "https://api.example.com/v1/echo",
             json.dumps({"Authorization": "Bearer <token>"}),
             "POST",
+            json.dumps({"connect_timeout": 3, "read_timeout": 10}),
             "Returns the echoed input",
         ),
     )
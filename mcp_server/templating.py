@@ -0,0 +1,128 @@
+import json
+import string
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+LOCATIONS = {"path", "query", "header", "json", "form"}
+
+
+class TemplateError(ValueError):
+    pass
+
+
+class RequestTemplate:
+    """A tool's ``req_template`` compiled against its ``req_url`` and method.
+
+    ``args`` maps argument names to a location (``path``, ``query``,
+    ``header``, ``json`` or ``form``), either as a plain string or as
+    ``{"in": <location>, "name": <upstream name>}``. Arguments named by a
+    ``{placeholder}`` in ``req_url`` go to the path (``{{``/``}}`` are literal
+    braces); anything else not mapped goes to ``default`` (query for
+    GET/DELETE, JSON body otherwise). Without a template ``req_url`` is used
+    verbatim.
+    ``response`` maps ``structuredContent`` keys to dotted paths in the
+    upstream JSON (``"items.0.id"``).
+    """
+
+    def __init__(self, url: str, method: str, template: Dict[str, Any]) -> None:
+        self.url_parts = _parse_url(url) if template else [(url, None)]
+        self.path_params = {field for _, field in self.url_parts if field is not None}
+        default = template.get("default") or ("query" if method in {"GET", "DELETE"} else "json")
+        if default not in LOCATIONS - {"path"}:
+            raise TemplateError(f"invalid default location: {default}")
+        self.default = default
+
+        self.args: Dict[str, Tuple[str, str]] = {name: ("path", name) for name in self.path_params}
+        for name, spec in (template.get("args") or {}).items():
+            if isinstance(spec, str):
+                location, target = spec, name
+            elif isinstance(spec, dict):
+                location, target = spec.get("in"), spec.get("name") or name
+            else:
+                raise TemplateError(f"invalid mapping for argument {name}")
+            if location not in LOCATIONS:
+                raise TemplateError(f"invalid location for argument {name}: {location}")
+            if location == "path" and target not in self.path_params:
+                raise TemplateError(f"req_url has no placeholder {{{target}}}")
+            self.args[name] = (location, target)
+        used = {default} | {location for location, _ in self.args.values()}
+        if {"json", "form"} <= used:
+            raise TemplateError("cannot mix json and form body arguments")
+        self.use_json = "json" in used
+
+        self.response: Optional[Dict[str, List[str]]] = None
+        if template.get("response"):
+            self.response = {
+                key: str(path).split(".") for key, path in template["response"].items()
+            }
+
+    def render(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Return ``url``/``params``/``headers``/``json``/``data`` for httpx."""
+        if not isinstance(arguments, dict):
+            raise TemplateError("arguments must be an object")
+        buckets: Dict[str, Dict[str, Any]] = {loc: {} for loc in LOCATIONS}
+        for name, value in arguments.items():
+            location, target = self.args.get(name, (self.default, name))
+            buckets[location][target] = value
+        missing = self.path_params - buckets["path"].keys()
+        if missing:
+            raise TemplateError(f"missing path arguments: {', '.join(sorted(missing))}")
+        url = "".join(
+            literal + (quote(str(buckets["path"][field]), safe="") if field else "")
+            for literal, field in self.url_parts
+        )
+        return {
+            "url": url,
+            "params": buckets["query"] or None,
+            "headers": {key: str(value) for key, value in buckets["header"].items()},
+            "json": buckets["json"] if self.use_json else None,
+            "data": buckets["form"] or None,
+        }
+
+    def extract(self, data: Any) -> Optional[Dict[str, Any]]:
+        if self.response is None:
+            return None
+        return {key: _lookup(data, path) for key, path in self.response.items()}
+
+
+def _parse_url(url: str) -> List[Tuple[str, Optional[str]]]:
+    """Split ``req_url`` into (literal text, placeholder name) pairs."""
+    try:
+        parsed = list(string.Formatter().parse(url))
+    except ValueError as exc:
+        raise TemplateError(f"invalid req_url: {exc}") from exc
+    parts: List[Tuple[str, Optional[str]]] = []
+    for literal, field, format_spec, conversion in parsed:
+        if field is not None and (not field.isidentifier() or format_spec or conversion):
+            raise TemplateError(f"req_url placeholder must be a plain name: {{{field}}}")
+        parts.append((literal, field))
+    return parts
+
+
+def _lookup(data: Any, path: List[str]) -> Any:
+    for part in path:
+        if isinstance(data, dict):
+            data = data.get(part)
+        elif isinstance(data, list) and part.lstrip("-").isdigit() and -len(data) <= int(part) < len(data):
+            data = data[int(part)]
+        else:
+            return None
+    return data
+
+
+@lru_cache(maxsize=1024)
+def _compile(url: str, method: str, template_json: str) -> RequestTemplate:
+    return RequestTemplate(url, method, json.loads(template_json))
+
+
+def compile_template(tool: Dict[str, Any]) -> RequestTemplate:
+    """Compile a tool's request template, caching it per (url, method, template)."""
+    template = tool.get("req_template")
+    if not isinstance(template, dict):
+        template = {}
+    return _compile(
+        tool["req_url"],
+        (tool.get("req_method") or "POST").upper(),
+        json.dumps(template, sort_keys=True),
+    )
@@ -0,0 +1,364 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+import httpx
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger("mcp-server.tracing")
+
+TRACE_EXPORTER = os.environ.get("MCP_TRACE_EXPORTER", "none")
+TRACE_SAMPLE_RATE = float(os.environ.get("MCP_TRACE_SAMPLE_RATE", "1.0"))
+TRACE_FILE = os.environ.get("MCP_TRACE_FILE", "mcp_traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.environ.get("MCP_TRACE_OTLP_ENDPOINT", "http://127.0.0.1:4318/v1/traces")
+TRACE_QUEUE_SIZE = int(os.environ.get("MCP_TRACE_QUEUE_SIZE", "2048"))
+TRACE_BATCH_SIZE = int(os.environ.get("MCP_TRACE_BATCH_SIZE", "512"))
+TRACE_FLUSH_INTERVAL = float(os.environ.get("MCP_TRACE_FLUSH_INTERVAL", "1.0"))
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+# Incoming X-Request-ID values end up in logs and upstream headers.
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+# httpcore trace phases we keep, keyed by the event name without its
+# "http11."/"http2."/"connection." prefix.
+_HTTP_PHASES = {
+    "connect_tcp": "connect",
+    "start_tls": "tls",
+    "send_request_headers": "send_headers",
+    "send_request_body": "send_body",
+    "receive_response_headers": "ttfb",
+    "receive_response_body": "body_read",
+}
+
+
+class Trace:
+    def __init__(
+        self,
+        trace_id: str,
+        request_id: str,
+        sampled: bool,
+        parent_span_id: Optional[str] = None,
+        recording: bool = False,
+    ) -> None:
+        self.trace_id = trace_id
+        self.request_id = request_id
+        # ``sampled`` is the decision passed on in traceparent; ``recording``
+        # is whether this process keeps spans (sampled and an exporter is set).
+        self.sampled = sampled
+        self.recording = recording
+        self.parent_span_id = parent_span_id
+        self.spans: List[Dict[str, Any]] = []
+
+    def add_span(
+        self,
+        name: str,
+        span_id: str,
+        parent_id: Optional[str],
+        start_ns: int,
+        end_ns: int,
+        attributes: Dict[str, Any],
+    ) -> None:
+        self.spans.append(
+            {
+                "trace_id": self.trace_id,
+                "span_id": span_id,
+                "parent_id": parent_id,
+                "name": name,
+                "start_ns": start_ns,
+                "end_ns": end_ns,
+                "attributes": attributes,
+            }
+        )
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("mcp_trace", default=None)
+_current_span: ContextVar[Optional[str]] = ContextVar("mcp_span", default=None)
+
+
+def _new_id(nbytes: int) -> str:
+    return "%0*x" % (nbytes * 2, random.getrandbits(nbytes * 8))
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[None]:
+    trace = _current_trace.get()
+    if trace is None or not trace.recording:
+        yield
+        return
+    span_id = _new_id(8)
+    parent_id = _current_span.get() or trace.parent_span_id
+    token = _current_span.set(span_id)
+    start_ns = time.time_ns()
+    try:
+        yield
+    except BaseException as exc:
+        attributes["error"] = repr(exc)
+        raise
+    finally:
+        _current_span.reset(token)
+        trace.add_span(name, span_id, parent_id, start_ns, time.time_ns(), attributes)
+
+
+def propagation_headers() -> Dict[str, str]:
+    """Headers that carry the current trace to an upstream service."""
+    trace = _current_trace.get()
+    if trace is None:
+        return {}
+    parent = _current_span.get() or trace.parent_span_id or _new_id(8)
+    flags = "01" if trace.sampled else "00"
+    return {
+        "traceparent": f"00-{trace.trace_id}-{parent}-{flags}",
+        "X-Request-ID": trace.request_id,
+    }
+
+
+def httpx_trace_hook() -> Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]]:
+    """An httpx ``trace`` extension recording connect/TTFB/body-read spans."""
+    trace = _current_trace.get()
+    if trace is None or not trace.recording:
+        return None
+    parent_id = _current_span.get()
+    started: Dict[str, int] = {}
+
+    async def hook(event: str, info: Dict[str, Any]) -> None:
+        phase, _, status = event.rpartition(".")
+        name = _HTTP_PHASES.get(phase.partition(".")[2])
+        if name is None:
+            return
+        if status == "started":
+            started[phase] = time.time_ns()
+        elif phase in started:
+            attributes = {"error": repr(info.get("exception"))} if status == "failed" else {}
+            trace.add_span(name, _new_id(8), parent_id, started.pop(phase), time.time_ns(), attributes)
+
+    return hook
+
+
+class JsonlExporter:
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def _write(self, spans: List[Dict[str, Any]]) -> None:
+        with open(self.path, "a", encoding="utf-8") as fh:
+            for item in spans:
+                fh.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+    async def export(self, spans: List[Dict[str, Any]]) -> None:
+        await asyncio.to_thread(self._write, spans)
+
+
+class OtlpHttpExporter:
+    """Posts spans as OTLP/HTTP JSON (e.g. to an OpenTelemetry Collector)."""
+
+    def __init__(self, endpoint: str, service_name: str = "mcp-server") -> None:
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _to_otlp(self, spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {"key": "service.name", "value": {"stringValue": self.service_name}}
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "mcp-server"},
+                            "spans": [
+                                {
+                                    "traceId": item["trace_id"],
+                                    "spanId": item["span_id"],
+                                    "parentSpanId": item["parent_id"] or "",
+                                    "name": item["name"],
+                                    "kind": 1,
+                                    "startTimeUnixNano": str(item["start_ns"]),
+                                    "endTimeUnixNano": str(item["end_ns"]),
+                                    "attributes": [
+                                        {"key": key, "value": {"stringValue": str(value)}}
+                                        for key, value in item["attributes"].items()
+                                    ],
+                                }
+                                for item in spans
+                            ],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    async def export(self, spans: List[Dict[str, Any]]) -> None:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=5.0)
+        resp = await self._client.post(self.endpoint, json=self._to_otlp(spans))
+        resp.raise_for_status()
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def _default_exporter() -> Any:
+    if TRACE_EXPORTER == "jsonl":
+        return JsonlExporter(TRACE_FILE)
+    if TRACE_EXPORTER == "otlp":
+        return OtlpHttpExporter(TRACE_OTLP_ENDPOINT)
+    return None
+
+
+class BatchSpanProcessor:
+    """Queues finished spans and exports them in batches from one task.
+
+    The queue is bounded: when the exporter cannot keep up, new spans are
+    dropped (and counted) instead of piling up tasks or connections.
+    """
+
+    def __init__(
+        self,
+        exporter: Any,
+        max_queue_size: int = TRACE_QUEUE_SIZE,
+        batch_size: int = TRACE_BATCH_SIZE,
+        flush_interval: float = TRACE_FLUSH_INTERVAL,
+    ) -> None:
+        self.exporter = exporter
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue: Optional["asyncio.Queue[Dict[str, Any]]"] = None
+        self._worker: Optional["asyncio.Task[None]"] = None
+
+    def submit(self, spans: List[Dict[str, Any]]) -> None:
+        if self.exporter is None:
+            return
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.ensure_future(self._run())
+        for item in spans:
+            try:
+                self._queue.put_nowait(item)
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._export(batch)
+
+    async def _export(self, batch: List[Dict[str, Any]]) -> None:
+        if self.dropped:
+            logger.warning("trace_export dropped=%s", self.dropped)
+            self.dropped = 0
+        try:
+            await self.exporter.export(batch)
+        except Exception as exc:
+            logger.warning("trace_export error=%r", exc)
+
+    async def shutdown(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        if self._queue is not None and not self._queue.empty():
+            batch = []
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            await self._export(batch)
+        aclose = getattr(self.exporter, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+_processor = BatchSpanProcessor(_default_exporter())
+
+
+def set_exporter(exporter: Any) -> None:
+    """Replace the span exporter; any object with ``async export(spans)`` works."""
+    _processor.exporter = exporter
+
+
+async def shutdown() -> None:
+    """Flush queued spans and close the exporter (app shutdown hook)."""
+    await _processor.shutdown()
+
+
+class TracingMiddleware:
+    """Starts a trace per HTTP request and queues its spans for export.
+
+    An incoming W3C ``traceparent`` is continued (including its sampling
+    decision); otherwise a new trace is sampled at ``sample_rate``. The
+    request id (a well-formed ``X-Request-ID``, or the trace id) is echoed on
+    the response.
+    """
+
+    def __init__(self, app: ASGIApp, sample_rate: float = TRACE_SAMPLE_RATE) -> None:
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        match = _TRACEPARENT.match(headers.get("traceparent", ""))
+        if match:
+            trace_id, parent_span_id = match.group(1), match.group(2)
+            sampled = bool(int(match.group(3), 16) & 1)
+        else:
+            trace_id, parent_span_id = _new_id(16), None
+            sampled = random.random() < self.sample_rate
+        request_id = headers.get("x-request-id", "")
+        trace = Trace(
+            trace_id,
+            request_id if _REQUEST_ID.match(request_id) else trace_id,
+            sampled,
+            parent_span_id,
+            recording=sampled and _processor.exporter is not None,
+        )
+        status: Dict[str, int] = {}
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                MutableHeaders(raw=message["headers"])["X-Request-ID"] = trace.request_id
+            await send(message)
+
+        token = _current_trace.set(trace)
+        try:
+            with span("request", method=scope["method"], path=scope["path"]):
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_trace.reset(token)
+            if trace.spans:
+                for item in reversed(trace.spans):
+                    if item["name"] == "request":
+                        item["attributes"]["status"] = status.get("code")
+                        break
+                _processor.submit(list(trace.spans))
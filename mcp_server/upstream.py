@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import math
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+import httpx
+
+from . import tracing
+
+logger = logging.getLogger("mcp-server.upstream")
+
+# Methods that are safe to send more than once (retries and hedged requests).
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRY_STATUS_CODES = {502, 503, 504}
+
+# Defaults keep the previous behaviour: one attempt with httpx's 5s timeouts.
+DEFAULT_POLICY: Dict[str, Any] = {
+    "connect_timeout": 5.0,
+    "read_timeout": 5.0,
+    "retries": 0,
+    "backoff_base": 0.1,
+    "backoff_max": 2.0,
+    "hedge": False,
+    "hedge_delay": None,
+    "hedge_min_samples": 20,
+}
+
+LATENCY_WINDOW = 200
+_latencies: Dict[str, Deque[float]] = {}
+
+
+def to_policy(raw: Any) -> Dict[str, Any]:
+    policy = dict(DEFAULT_POLICY)
+    if isinstance(raw, dict):
+        for key in DEFAULT_POLICY:
+            if raw.get(key) is not None:
+                policy[key] = raw[key]
+    return policy
+
+
+def _record_latency(tool_name: str, seconds: float) -> None:
+    samples = _latencies.get(tool_name)
+    if samples is None:
+        samples = _latencies[tool_name] = deque(maxlen=LATENCY_WINDOW)
+    samples.append(seconds)
+
+
+def p95_latency(tool_name: str) -> Optional[float]:
+    samples = _latencies.get(tool_name)
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)]
+
+
+def _hedge_delay(tool_name: str, policy: Dict[str, Any]) -> Optional[float]:
+    if policy["hedge_delay"] is not None:
+        return float(policy["hedge_delay"])
+    samples = _latencies.get(tool_name)
+    if not samples or len(samples) < int(policy["hedge_min_samples"]):
+        return None
+    return p95_latency(tool_name)
+
+
+def _backoff(policy: Dict[str, Any], attempt: int) -> float:
+    # Full jitter: uniform in [0, min(max, base * 2^attempt)].
+    cap = min(float(policy["backoff_max"]), float(policy["backoff_base"]) * (2 ** attempt))
+    return random.uniform(0, cap)
+
+
+async def _timed_request(
+    client: httpx.AsyncClient,
+    tool_name: str,
+    method: str,
+    url: str,
+    record: bool = True,
+    **kwargs: Any,
+) -> httpx.Response:
+    with tracing.span("upstream.attempt", tool=tool_name, method=method):
+        hook = tracing.httpx_trace_hook()
+        if hook is not None:
+            kwargs["extensions"] = {"trace": hook}
+        started = time.perf_counter()
+        resp = await client.request(method, url, **kwargs)
+        if record:
+            _record_latency(tool_name, time.perf_counter() - started)
+    return resp
+
+
+async def _hedged_request(
+    client: httpx.AsyncClient,
+    tool_name: str,
+    policy: Dict[str, Any],
+    method: str,
+    url: str,
+    **kwargs: Any,
+) -> httpx.Response:
+    # One latency sample per call, measured from when the primary was sent.
+    # Per-attempt samples would drop the (slow) cancelled loser and time the
+    # hedge from when it fired, dragging the p95 hedge delay down over time.
+    delay = _hedge_delay(tool_name, policy)
+    started = time.perf_counter()
+    primary = asyncio.ensure_future(
+        _timed_request(client, tool_name, method, url, record=False, **kwargs)
+    )
+    pending = {primary}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=delay)
+        if done:
+            resp = primary.result()
+        else:
+            logger.info("hedge tool=%s delay=%.3f", tool_name, delay)
+            pending.add(
+                asyncio.ensure_future(
+                    _timed_request(client, tool_name, method, url, record=False, **kwargs)
+                )
+            )
+            resp = None
+            error: BaseException | None = None
+            while pending and (resp is None or resp.status_code in RETRY_STATUS_CODES):
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif resp is None or resp.status_code in RETRY_STATUS_CODES:
+                        # A 502/503/504 only wins if the other attempt does no better.
+                        resp = task.result()
+            if resp is None:
+                assert error is not None
+                raise error
+        _record_latency(tool_name, time.perf_counter() - started)
+        return resp
+    finally:
+        # The loser (or both attempts, if we were cancelled) must not keep running,
+        # and must be torn down before the caller closes the client's pool.
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def send(
+    client: httpx.AsyncClient,
+    tool: Dict[str, Any],
+    method: str,
+    url: str,
+    **kwargs: Any,
+) -> httpx.Response:
+    """Send an upstream request honouring the tool's ``req_policy``.
+
+    Timeouts apply to every request. Retries with jittered backoff and hedged
+    requests are only used for idempotent methods.
+    """
+    tool_name = tool.get("tool_name") or url
+    policy = to_policy(tool.get("req_policy"))
+    kwargs["timeout"] = httpx.Timeout(
+        float(policy["read_timeout"]),
+        connect=float(policy["connect_timeout"]),
+    )
+    idempotent = method in IDEMPOTENT_METHODS
+    attempts = 1 + (max(0, int(policy["retries"])) if idempotent else 0)
+    hedge = idempotent and bool(policy["hedge"])
+
+    for attempt in range(attempts):
+        last = attempt == attempts - 1
+        try:
+            if hedge:
+                resp = await _hedged_request(client, tool_name, policy, method, url, **kwargs)
+            else:
+                resp = await _timed_request(client, tool_name, method, url, **kwargs)
+        except httpx.TransportError as exc:
+            if last:
+                raise
+            logger.info("retry tool=%s attempt=%s error=%r", tool_name, attempt + 1, exc)
+        else:
+            if last or resp.status_code not in RETRY_STATUS_CODES:
+                return resp
+            logger.info("retry tool=%s attempt=%s status=%s", tool_name, attempt + 1, resp.status_code)
+        await asyncio.sleep(_backoff(policy, attempt))
+    raise RuntimeError("unreachable")